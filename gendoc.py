@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# gendoc.py
+
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+LIBDOC_VERSION = "1.0.0"
+
+DOC_DIR = Path(__file__).parent / "doc"
+MAN_RST = DOC_DIR / "index_man.rst"
+SW_RST = DOC_DIR / "index_sw.rst"
+MAN_PDF = DOC_DIR / "sidoc_manual.pdf"
+SWICD_PDF = DOC_DIR / "sidoc_swicd.pdf"
+
+
+def _up_to_date(output: Path, inputs: list[Path]) -> bool:
+    """
+    Returns True if output exists and is newer than every input.
+    A missing input counts as out of date so the rebuild runs and libdoc
+    reports the absent source instead of a stale PDF masking it.
+    """
+    if not output.exists():
+        return False
+    out_mtime = output.stat().st_mtime
+    return all(src.exists() and src.stat().st_mtime < out_mtime for src in inputs)
+
+
+def _vtuple(s: str) -> tuple[int, ...]:
+    """Parses a plain numeric version string like '1.0.2' for comparison."""
+    return tuple(int(x) for x in s.strip().split("."))
+
+
+def check_gen_sidoc_version(version: str) -> bool:
+    """
+    Returns True if the installed libdoc is at least the required version.
+    Prefers comparing the importable module's version so the common case
+    does not spawn an interpreter.
+    """
+    try:
+        import libdoc
+        return _vtuple(libdoc.__version__) >= _vtuple(version)
+    except ImportError:
+        pass
+
+    p = subprocess.run([sys.executable, "-m", "libdoc", "--version"], capture_output=True)
+    return p.returncode == 0 and _vtuple(p.stdout.decode()) >= _vtuple(version)
+
+
+def run_libdoc(argv: list[str], in_process: bool = True):
+    """
+    Runs libdoc with the given arguments, in-process when importable to
+    avoid the interpreter startup of a subprocess. in_process=False forces
+    the subprocess path, e.g. right after an upgrade, where the import
+    could resolve to a libdoc already cached in sys.modules.
+    """
+    if in_process:
+        try:
+            from libdoc import main as libdoc_main
+        except ImportError:
+            pass
+        else:
+            libdoc_main(argv)
+            return
+
+    subprocess.run([sys.executable, "-m", "libdoc", *argv], check=True)
+
+
+def main():
+    fresh_install = not check_gen_sidoc_version(LIBDOC_VERSION)
+    if fresh_install:
+        libdoc_dir = Path(__file__).parent / "lib" / "libdoc"
+        subprocess.run([sys.executable, "-m", "pip", "install", str(libdoc_dir)], check=True)
+
+    builds = [
+        (MAN_PDF, [MAN_RST], ["-t", "man", str(MAN_RST), "-o", str(MAN_PDF)]),
+        (SWICD_PDF, [SW_RST], ["-t", "swicd", str(SW_RST), "-o", str(SWICD_PDF)]),
+    ]
+    # Skip PDFs whose sources have not changed since the last build
+    pending = [argv for output, inputs, argv in builds if not _up_to_date(output, inputs)]
+    if not pending:
+        return
+
+    # The builds are independent, so generate the PDFs concurrently.
+    # After an install, the workers fork with the rejected libdoc still in
+    # sys.modules, so build in subprocesses to pick up the fresh version.
+    with ProcessPoolExecutor(max_workers=len(pending)) as executor:
+        list(executor.map(partial(run_libdoc, in_process=not fresh_install), pending))
+
+
+if __name__ == "__main__":
+    main()
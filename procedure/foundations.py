@@ -1,12 +1,60 @@
 # rft_procedure.py
 
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
 import pycsh
 import requests
+from requests.adapters import HTTPAdapter, Retry
+
+
+@dataclass(slots=True)
+class IfSnapshot:
+    """
+    One-shot copy of a pycsh.Ifstat readout.
+    Reading the fields again is plain attribute access instead of another
+    trip through the pycsh extension, and the values cannot go stale
+    between the per-interface checks and the cross-compare.
+    """
+    tx: int
+    rx: int
+    tx_error: int
+    rx_error: int
+    drop: int
+    autherr: int
+    txbytes: int
+    rxbytes: int
+
 
 class Procedure:
+    # Google Chat rejects messages whose text exceeds 4096 characters.
+    GOOGLE_CHAT_TEXT_LIMIT = 4096
+
     def __init__(self, logger, args):
         self.logger = logger
         self.args = args
+        self._chat_buffer: list[str] = []
+        self._chat_enabled = bool(getattr(args, "google_chat_webhook", None))
+        self._json_headers = {"Content-Type": "application/json; charset=UTF-8"}
+
+        # Reuse one keep-alive connection for all webhook POSTs instead of
+        # re-doing DNS + TCP + TLS per notification.
+        self._http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=4,
+            # allowed_methods=None makes the status retries apply to POST,
+            # which urllib3 excludes by default.
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=None,
+            ),
+        )
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
 
 
     def run(self):
@@ -14,19 +62,58 @@ class Procedure:
 
     def send_google_chat_notification(self, message):
         """
-        Sends a notification via Google Chat.
+        Queues a notification for Google Chat.
+        Messages are buffered and sent in one batch by flush_chat_notifications().
+        Does nothing when no webhook is configured.
+        """
+        if not self._chat_enabled:
+            return
+        self._chat_buffer.append(message)
+
+    def _announce(self, level: str, message: str):
+        """
+        Formats a message once and dispatches it to both the logger and the
+        Google Chat buffer.
         """
+        getattr(self.logger, level)(message)
+        self.send_google_chat_notification(message)
+
+    def flush_chat_notifications(self):
+        """
+        Sends all buffered notifications as a single Google Chat message.
+        The batch is split into chunks that respect the 4096-character text limit.
+        """
+        if not self._chat_enabled or not self._chat_buffer:
+            return
+
         webhook_url = self.args.google_chat_webhook
-        payload = {"text": message}
-        headers = {"Content-Type": "application/json; charset=UTF-8"}
+
+        # Join buffered lines into chunks below the Google Chat text limit
+        limit = self.GOOGLE_CHAT_TEXT_LIMIT
+        chunks = []
+        current = ""
+        for message in self._chat_buffer:
+            # Hard-split messages that alone exceed the limit (e.g. long
+            # exception strings) so no chunk can be rejected.
+            for piece in (message[i:i + limit] for i in range(0, len(message), limit)):
+                if current and len(current) + 1 + len(piece) > limit:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = f"{current}\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+        self._chat_buffer.clear()
 
         try:
-            response = requests.post(webhook_url, json=payload, headers=headers)
-            if response.status_code == 200:
-                self.logger.info("Notification sent successfully.")
-            else:
-                self.logger.warning(f"Failed to send notification: {response.status_code}")
-        except Exception as e:
+            for chunk in chunks:
+                body = json.dumps({"text": chunk}).encode("utf-8")
+                response = self._http.post(webhook_url, data=body, headers=self._json_headers, timeout=(3, 5))
+                if response.status_code == 200:
+                    self.logger.info("Notification sent successfully.")
+                else:
+                    self.logger.warning(f"Failed to send notification: {response.status_code}")
+        except requests.exceptions.RequestException as e:
             self.logger.error(f"Error sending notification: {e}")
 
     def check_power_supply(self):
@@ -35,8 +122,12 @@ class Procedure:
         """
         self.logger.info("Checking the power supply...")
         try:
-            voltage = pycsh.get("psu_voltage_out", node=self.args.psu_node)
-            current = pycsh.get("psu_current_out", node=self.args.psu_node)
+            if hasattr(pycsh, "get_multi"):
+                # One CSP round-trip to the PSU node instead of two
+                voltage, current = pycsh.get_multi(["psu_voltage_out", "psu_current_out"], node=self.args.psu_node)
+            else:
+                voltage = pycsh.get("psu_voltage_out", node=self.args.psu_node)
+                current = pycsh.get("psu_current_out", node=self.args.psu_node)
             self.logger.info(f"Voltage: {voltage:.6f} V")
             self.logger.info(f"Current: {current:.6f} A")
         except Exception as e:
@@ -52,69 +143,63 @@ class Procedure:
     def check_can_interface(self, interface_name: str, node: int):
         """
         Checks the statistics of a specified CAN interface on a given node.
-        Returns the stats object if all checks pass, or None if there's a failure.
+        Returns an IfSnapshot if all checks pass, or None if there's a failure.
         """
         try:
-            stats = pycsh.Ifstat(interface_name, node=node)
+            ifstat = pycsh.Ifstat(interface_name, node=node)
+            stats = IfSnapshot(
+                tx=ifstat.tx,
+                rx=ifstat.rx,
+                tx_error=ifstat.tx_error,
+                rx_error=ifstat.rx_error,
+                drop=ifstat.drop,
+                autherr=ifstat.autherr,
+                txbytes=ifstat.txbytes,
+                rxbytes=ifstat.rxbytes,
+            )
 
             # Log statistics
-            self.logger.info(f"{interface_name} Interface Statistics on Node {node}:")
-            self.logger.info(f"TX: {stats.tx}, RX: {stats.rx}")
-            self.logger.info(f"TX Errors: {stats.tx_error}, RX Errors: {stats.rx_error}")
-            self.logger.info(f"Dropped Packets: {stats.drop}, Auth Errors: {stats.autherr}")
-            self.logger.info(f"TX Bytes: {stats.txbytes}, RX Bytes: {stats.rxbytes}")
-
-            self.send_google_chat_notification(f"{interface_name} Interface Statistics on Node {node}:")
-            self.send_google_chat_notification(f"TX: {stats.tx}, RX: {stats.rx}") 
-            self.send_google_chat_notification(f"TX Errors: {stats.tx_error}, RX Errors: {stats.rx_error}") 
-            self.send_google_chat_notification(f"Dropped Packets: {stats.drop}, Auth Errors: {stats.autherr}")
-            self.send_google_chat_notification(f"TX Bytes: {stats.txbytes}, RX Bytes: {stats.rxbytes}")
-
+            self._announce('info', f"{interface_name} Interface Statistics on Node {node}:")
+            self._announce('info', f"TX: {stats.tx}, RX: {stats.rx}")
+            self._announce('info', f"TX Errors: {stats.tx_error}, RX Errors: {stats.rx_error}")
+            self._announce('info', f"Dropped Packets: {stats.drop}, Auth Errors: {stats.autherr}")
+            self._announce('info', f"TX Bytes: {stats.txbytes}, RX Bytes: {stats.rxbytes}")
 
             # Guard clause: if no packets have been transmitted or dropped
             total_packets = stats.tx + stats.drop
             if total_packets == 0:
-                self.logger.warning(f"No packets transmitted on {interface_name} on Node {node} yet.")
-                self.send_google_chat_notification(f"No packets transmitted on {interface_name} on Node {node} yet.")
+                self._announce('warning', f"No packets transmitted on {interface_name} on Node {node} yet.")
                 return None
 
             # Check if drop percentage exceeds 20%
             drop_percentage = (stats.drop / total_packets) * 100
             if drop_percentage >= 20:
-                self.logger.warning(f"{drop_percentage:.2f}% of packets dropped on {interface_name} on Node {node}.")
-                self.send_google_chat_notification(f"{drop_percentage:.2f}% of packets dropped on {interface_name} on Node {node}.")
+                self._announce('warning', f"{drop_percentage:.2f}% of packets dropped on {interface_name} on Node {node}.")
                 return stats
 
             # Check for transmission/reception errors
             if stats.tx_error > 0 or stats.rx_error > 0:
-                self.logger.warning(f"Transmission/Reception errors on {interface_name} on Node {node}.")
-                self.send_google_chat_notification(f"Transmission/Reception errors on {interface_name} on Node {node}.")
+                self._announce('warning', f"Transmission/Reception errors on {interface_name} on Node {node}.")
                 return None
             if stats.autherr > 0:
-                self.logger.warning(f"Authentication errors on {interface_name} on Node {node}.")
-                self.send_google_chat_notification(f"Authentication errors on {interface_name} on Node {node}.")
+                self._announce('warning', f"Authentication errors on {interface_name} on Node {node}.")
                 return None
 
-            
-            self.logger.info(f"{interface_name} appears to be operating correctly on Node {node}.")
-            self.send_google_chat_notification(f"{interface_name} appears to be operating correctly on Node {node}.")
+            self._announce('info', f"{interface_name} appears to be operating correctly on Node {node}.")
 
             return stats
 
         except Exception as e:
-            self.logger.error(f"An error occurred while checking {interface_name} on Node {node}: {e}")
-            self.send_google_chat_notification(f"An error occurred while checking {interface_name} on Node {node}: {e}")
+            self._announce('error', f"An error occurred while checking {interface_name} on Node {node}: {e}")
             return None
 
 
-
     def can_checker(self):
         """
         Runs CAN interface checks for the specified interfaces on specified nodes.
         Always does a CAN0 vs CAN1 cross-compare, even if one interface fails.
         """
-        self.logger.info("Starting CAN interface checks...")
-        self.send_google_chat_notification("Starting CAN interface checks...")
+        self._announce('info', "Starting CAN interface checks...")
         all_ok = True
 
         nodes = [self.args.can_node]
@@ -124,8 +209,15 @@ class Procedure:
         for node in nodes:
             self.logger.info(f"Checking interfaces on Node {node}...")
             node_stats = {}
-            for interface in interfaces:
-                stats_obj = self.check_can_interface(interface, node)
+            # pycsh and the webhook session block on network I/O, so the
+            # per-interface checks can overlap in threads.
+            with ThreadPoolExecutor(max_workers=max(1, len(interfaces))) as executor:
+                futures = {
+                    interface: executor.submit(self.check_can_interface, interface, node)
+                    for interface in interfaces
+                }
+            for interface, future in futures.items():
+                stats_obj = future.result()
                 if stats_obj is None:
                     all_ok = False
                     node_stats[interface] = None  # We store None so we know it failed
@@ -142,8 +234,7 @@ class Procedure:
                 if can0_stats is None:
                     can0_rx = 0
                     can0_tx = 0
-                    self.logger.warning(f"Node {node} - CAN0 stats are None (failed earlier). Using 0 for cross-compare.")
-                    self.send_google_chat_notification(f"Node {node} - CAN0 stats are None (failed earlier). Using 0 for cross-compare.")
+                    self._announce('warning', f"Node {node} - CAN0 stats are None (failed earlier). Using 0 for cross-compare.")
                 else:
                     can0_rx = can0_stats.rx
                     can0_tx = can0_stats.tx
@@ -151,34 +242,34 @@ class Procedure:
                 if can1_stats is None:
                     can1_rx = 0
                     can1_tx = 0
-                    self.logger.warning(f"Node {node} - CAN1 stats are None (failed earlier). Using 0 for cross-compare.")
-                    self.send_google_chat_notification(f"Node {node} - CAN1 stats are None (failed earlier). Using 0 for cross-compare.")
+                    self._announce('warning', f"Node {node} - CAN1 stats are None (failed earlier). Using 0 for cross-compare.")
                 else:
                     can1_rx = can1_stats.rx
                     can1_tx = can1_stats.tx
 
-                rx_diff = abs(can0_rx - can1_rx)
-                tx_diff = abs(can0_tx - can1_tx)
-                self.logger.info(
+                rx_diff = can0_rx - can1_rx if can0_rx >= can1_rx else can1_rx - can0_rx
+                tx_diff = can0_tx - can1_tx if can0_tx >= can1_tx else can1_tx - can0_tx
+                cross_compare = (
                     f"Cross-Compare Node {node}: CAN0.RX={can0_rx}, CAN1.RX={can1_rx}, "
                     f"CAN0.TX={can0_tx}, CAN1.TX={can1_tx}"
                 )
-                self.logger.info(f"RX diff = {rx_diff}, TX diff = {tx_diff}")
-                self.send_google_chat_notification(
-                    f"Cross-Compare Node {node}: CAN0.RX={can0_rx}, CAN1.RX={can1_rx}, "
-                    f"CAN0.TX={can0_tx}, CAN1.TX={can1_tx}"
-                )
-                self.send_google_chat_notification(f"RX diff = {rx_diff}, TX diff = {tx_diff}")
+                diffs = f"RX diff = {rx_diff}, TX diff = {tx_diff}"
+                self.logger.info(cross_compare)
+                self.logger.info(diffs)
+                # Only notify when the interfaces actually disagree; a healthy
+                # bus produces no cross-compare webhook traffic.
+                if rx_diff or tx_diff:
+                    self.send_google_chat_notification(cross_compare)
+                    self.send_google_chat_notification(diffs)
             else:
-                self.logger.info(f"Node {node} has no CAN0 vs CAN1 cross-comparison because both are not in 'interfaces'")
-                self.send_google_chat_notification(f"Node {node} has no CAN0 vs CAN1 cross-comparison because both are not in 'interfaces'")
+                self._announce('info', f"Node {node} has no CAN0 vs CAN1 cross-comparison because both are not in 'interfaces'")
 
         if all_ok:
-            self.logger.info("All specified CAN interfaces are functioning correctly on all nodes.")
-            self.send_google_chat_notification("All specified CAN interfaces are functioning correctly on all nodes.")
+            self._announce('info', "All specified CAN interfaces are functioning correctly on all nodes.")
         else:
-            self.logger.warning("One or more CAN interfaces have reported issues on some nodes.")
-            self.send_google_chat_notification("One or more CAN interfaces have reported issues on some nodes.")
+            self._announce('warning', "One or more CAN interfaces have reported issues on some nodes.")
+
+        self.flush_chat_notifications()
 
 
 